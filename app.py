@@ -1,17 +1,46 @@
 ## ВАРИАНТ кода для генерации новостей с обновлённой библиотекой OpenAI
 
 import os
-from typing import Dict
+import asyncio
+import logging
+import tempfile
+import time
+from typing import Annotated, Any, AsyncIterator, Dict, List, Optional
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import requests
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+import httpx
+import numpy as np
+import orjson
+import tiktoken
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    DefaultAsyncHttpxClient,
+    NotFoundError,
+    RateLimitError,
+)
+from tenacity import RetryCallState, retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 # Загружаем переменные окружения из .env файла для локальной разработки
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# Логгер приложения настраивается отдельно: uvicorn запускается с log_level="warning",
+# а строки о попаданиях в кэши пишутся на уровне INFO
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(_log_handler)
+    logger.propagate = False
+logger.setLevel(LOG_LEVEL)
 
 # Получаем API-ключи из переменных окружения
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -23,128 +52,949 @@ if not OPENAI_API_KEY or not CURRENTS_API_KEY:
         "Необходимо указать переменные окружения OPENAI_API_KEY и CURRENTS_API_KEY"
     )
 
-# Инициализация клиента OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Инициализация асинхронного клиента OpenAI
+# (повторы выполняются в _chat, поэтому встроенные повторы SDK отключены).
+# Собственный HTTP-клиент с HTTP/2 мультиплексирует параллельные запросы
+# в одном соединении и держит больший пул, чем клиент SDK по умолчанию.
+# Таймаут чтения как у SDK (600 с): генерация поста целиком может идти долго
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "600"))
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    max_retries=0,
+    http_client=DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=5.0),
+    ),
+)
+
+_CURRENTS_URL = "https://api.currentsapi.services/v1/latest-news"
+
+# Общий HTTP-клиент для Currents API (пул соединений переиспользуется между запросами)
+_http = httpx.AsyncClient(
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    http2=True,
+)
+
+@app.on_event("shutdown")
+async def close_http_client():
+    """
+    Закрывает HTTP-клиенты при остановке приложения.
+    """
+    await _http.aclose()
+    await client.close()
+
+# Кэш новостей по теме: лента Currents меняется раз в несколько минут
+NEWS_CACHE_TTL = int(os.getenv("NEWS_CACHE_TTL", 300))
+_news_cache: TTLCache = TTLCache(maxsize=1024, ttl=NEWS_CACHE_TTL)
+# Загрузки новостей, выполняющиеся в данный момент: одновременные промахи кэша
+# по одной теме ждут одну задачу и получают общий результат или общую ошибку
+_news_inflight: Dict[str, "asyncio.Task[str]"] = {}
+
+# Семантический кэш готовых постов: похожие по смыслу темы получают сохранённый результат
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 10000))
+# Пост строится по свежим новостям, поэтому записи старше SEMANTIC_CACHE_TTL секунд
+# считаются промахом
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", 3600))
+SEMANTIC_CACHE_DIR = os.getenv("SEMANTIC_CACHE_DIR", ".semantic_cache")
+SEMANTIC_CACHE_FILE = os.path.join(SEMANTIC_CACHE_DIR, "semantic_cache.npz")
+# Кольцевой буфер нормированных эмбеддингов, времени создания записей (unix time)
+# и параллельный список результатов; при переполнении вытесняется самая старая запись (FIFO)
+_semantic_matrix = np.zeros((SEMANTIC_CACHE_MAX_ENTRIES, EMBEDDING_DIM), dtype=np.float32)
+_semantic_times = np.zeros(SEMANTIC_CACHE_MAX_ENTRIES, dtype=np.float64)
+_semantic_payloads: List[Dict[str, str]] = []
+_semantic_next = 0
+
+class TokenBucket:
+    """
+    Ограничитель числа запросов и токенов в минуту для вызовов OpenAI.
+    Ёмкость восполняется равномерно; ожидающие вызовы обслуживаются по очереди.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int) -> None:
+        """
+        Ждёт, пока в лимитах не окажется места для одного запроса на tokens токенов.
+        """
+        # Запрос больше минутного лимита иначе не прошёл бы никогда
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep(max(
+                    (1 - self._requests) * 60 / self.rpm,
+                    (tokens - self._tokens) * 60 / self.tpm,
+                ))
+
+# Ограничения на вызовы OpenAI (действуют в пределах одного процесса)
+_openai_semaphore = asyncio.Semaphore(int(os.getenv("OPENAI_MAX_CONCURRENCY", "20")))
+_openai_bucket = TokenBucket(
+    rpm=int(os.getenv("OPENAI_RPM", "500")),
+    tpm=int(os.getenv("OPENAI_TPM", "30000")),
+)
+_ENC = tiktoken.encoding_for_model("gpt-4o")
+
+def estimate_tokens(params: Dict[str, Any]) -> int:
+    """
+    Оценивает число токенов запроса: длина промпта плюс max_tokens ответа.
+    """
+    prompt_tokens = sum(len(_ENC.encode(message["content"])) for message in params["messages"])
+    return prompt_tokens + params.get("max_tokens", 0)
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Повторяем только временные сбои: сетевые ошибки, 429 и 5xx.
+    Ошибки запроса (400, 401, 404 и т.п.) повторять бессмысленно.
+    Таймаут OpenAI тоже не повторяем: он наступает после полного ожидания генерации,
+    и каждый повтор оплачивал бы её заново.
+    """
+    if isinstance(exc, APITimeoutError):
+        return False
+    if isinstance(exc, (httpx.TransportError, APIConnectionError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    elif isinstance(exc, APIStatusError):
+        status = exc.status_code
+    else:
+        return False
+    return status == 429 or status >= 500
+
+_backoff = wait_random_exponential(min=1, max=20)
+
+def wait_retry_after(retry_state: RetryCallState) -> float:
+    """
+    Пауза перед повтором: значение заголовка Retry-After, если сервер его прислал,
+    иначе экспоненциальная задержка со случайным разбросом.
+    """
+    exc = retry_state.outcome.exception()
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), 60.0)
+        except ValueError:
+            pass
+    return _backoff(retry_state)
+
+# Общая политика повторов для вызовов внешних API
+retry_transient = retry(
+    retry=retry_if_exception(is_retryable),
+    wait=wait_retry_after,
+    stop=stop_after_attempt(4),
+    reraise=True,
+)
+
+class LimitedStream:
+    """
+    Потоковый ответ OpenAI, который удерживает слот _openai_semaphore, пока поток
+    не будет дочитан или закрыт: иначе долгие потоки не учитывались бы в лимите.
+    """
+
+    def __init__(self, stream: Any):
+        self._stream = stream
+        self._released = False
+
+    def _release(self) -> None:
+        if not self._released:
+            self._released = True
+            _openai_semaphore.release()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            self._release()
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iterate()
+
+    async def close(self) -> None:
+        try:
+            await self._stream.close()
+        finally:
+            self._release()
+
+@retry_transient
+async def _chat(**params: Any):
+    """
+    Вызывает chat.completions.create с учётом лимитов OpenAI и повторами при ошибках.
+    Для stream=True возвращает LimitedStream, который освобождает слот при закрытии.
+    """
+    await _openai_semaphore.acquire()
+    try:
+        await _openai_bucket.acquire(estimate_tokens(params))
+        response = await client.chat.completions.create(**params)
+    except BaseException:
+        _openai_semaphore.release()
+        raise
+    if params.get("stream"):
+        return LimitedStream(response)
+    _openai_semaphore.release()
+    return response
+
+# Ограничение длины темы в токенах: слишком длинная тема отклоняется (422)
+# до любых обращений к внешним API
+MAX_TOPIC_TOKENS = int(os.getenv("MAX_TOPIC_TOKENS", "64"))
+
+def check_topic(value: str) -> str:
+    """
+    Проверяет длину темы в токенах. Пробелы по краям уже удалены, а пустая тема
+    отклонена ограничениями TopicText.
+    """
+    if len(_ENC.encode(value)) > MAX_TOPIC_TOKENS:
+        raise ValueError(f"тема длиннее {MAX_TOPIC_TOKENS} токенов")
+    return value
+
+# Тема: от 2 до 128 символов, буквы (\w включает кириллицу), цифры, пробелы и пунктуация.
+# Ограничения проверяются pydantic до вызова обработчика, некорректный запрос получает 422
+TopicText = Annotated[str, Field(
+    min_length=2,
+    max_length=128,
+    pattern=r"""^[\w\s\-.,'/&:()?!"«»+#%$@№]+$""",
+)]
 
 class Topic(BaseModel):
     """
     Модель запроса для генерации поста.
     """
-    topic: str
+    model_config = ConfigDict(str_strip_whitespace=True, extra="forbid")
+
+    topic: TopicText
+
+    @field_validator("topic")
+    @classmethod
+    def validate_topic(cls, value: str) -> str:
+        return check_topic(value)
+
+# Размер пакета: Batch API принимает до 50 000 запросов в задании, на тему их три
+BATCH_MAX_TOPICS = min(int(os.getenv("BATCH_MAX_TOPICS", "1000")), 50000 // 3)
+# Сколько запросов новостей выполняется одновременно при подготовке пакета
+BATCH_NEWS_CONCURRENCY = int(os.getenv("BATCH_NEWS_CONCURRENCY", "10"))
+
+class Topics(BaseModel):
+    """
+    Модель запроса для пакетной генерации постов.
+    """
+    model_config = ConfigDict(str_strip_whitespace=True, extra="forbid")
+
+    topics: List[TopicText] = Field(..., min_length=1, max_length=BATCH_MAX_TOPICS)
+
+    @field_validator("topics")
+    @classmethod
+    def validate_topics(cls, value: List[str]) -> List[str]:
+        return [check_topic(topic) for topic in value]
+
+@retry_transient
+async def _request_news(topic: str) -> httpx.Response:
+    """
+    Запрашивает новости по теме у Currents API с повторами при временных сбоях.
+    """
+    # Кортеж пар вместо словаря: меняется только keywords.
+    # page_size=5 — нужны только пять заголовков, ответ API меньше и быстрее разбирается
+    params = (
+        ("language", "en"),
+        ("keywords", topic),
+        ("page_size", 5),
+        ("apiKey", CURRENTS_API_KEY),
+    )
+    response = await _http.get(_CURRENTS_URL, params=params)
+    response.raise_for_status()
+    return response
 
-def get_recent_news(topic: str) -> str:
+async def _fetch_news(topic: str) -> str:
     """
     Получает свежие новости по теме через Currents API.
     Возвращает заголовки 5 новостей или сообщение об отсутствии новостей.
     """
-    url = "https://api.currentsapi.services/v1/latest-news"
-    params = {
-        "language": "en",
-        "keywords": topic,
-        "apiKey": CURRENTS_API_KEY
-    }
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        news_data = response.json().get("news", [])
-        if not news_data:
-            return "Свежих новостей не найдено."
-        return "\n".join([article["title"] for article in news_data[:5]])
-    except requests.RequestException as e:
+        response = await _request_news(topic)
+        news_data = orjson.loads(response.content).get("news", [])
+        titles = (article["title"] for article in news_data[:5] if "title" in article)
+        return "\n".join(titles) or "Свежих новостей не найдено."
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Ошибка запроса к Currents API: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при обработке новостей: {str(e)}")
 
-def generate_content(topic: str) -> Dict[str, str]:
+async def get_recent_news(topic: str) -> str:
+    """
+    Возвращает свежие новости по теме, используя кэш с ограниченным временем жизни.
+    """
+    key = topic.strip().lower()
+    news = _news_cache.get(key)
+    if news is not None:
+        logger.info("news_cache hit topic=%r", key)
+        return news
+
+    task = _news_inflight.get(key)
+    if task is None:
+        logger.info("news_cache miss topic=%r", key)
+        task = asyncio.create_task(_load_news(topic, key))
+        _news_inflight[key] = task
+        task.add_done_callback(lambda _: _news_inflight.pop(key, None))
+    else:
+        logger.info("news_cache wait topic=%r", key)
+    # shield: отключение одного клиента не должно отменять загрузку для остальных
+    return await asyncio.shield(task)
+
+async def _load_news(topic: str, key: str) -> str:
+    """
+    Загружает новости по теме и кладёт их в кэш.
+    """
+    news = await _fetch_news(topic)
+    _news_cache[key] = news
+    return news
+
+async def embed_topic(topic: str) -> Optional[np.ndarray]:
+    """
+    Возвращает нормированный эмбеддинг темы или None, если его не удалось получить.
+    """
+    try:
+        response = await client.embeddings.create(model=EMBEDDING_MODEL, input=topic)
+    except Exception as e:
+        # Без эмбеддинга работаем без кэша, а не отказываем в генерации
+        logger.warning("semantic_cache embedding failed: %s", e)
+        return None
+    embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+def semantic_cache_lookup(embedding: np.ndarray) -> Optional[Dict[str, str]]:
+    """
+    Ищет в кэше пост для ближайшей по косинусной близости темы.
+    Устаревшие записи не учитываются.
+    """
+    count = len(_semantic_payloads)
+    if not count:
+        return None
+    sims = _semantic_matrix[:count] @ embedding
+    sims[_semantic_times[:count] < time.time() - SEMANTIC_CACHE_TTL] = -np.inf
+    best = int(np.argmax(sims))
+    if sims[best] > SEMANTIC_CACHE_THRESHOLD:
+        logger.info("semantic_cache hit similarity=%.3f", sims[best])
+        return _semantic_payloads[best]
+    logger.info("semantic_cache miss similarity=%.3f", sims[best])
+    return None
+
+def semantic_cache_store(embedding: np.ndarray, payload: Dict[str, str]) -> None:
+    """
+    Сохраняет пост в кэш, вытесняя самую старую запись при переполнении.
+    """
+    global _semantic_next
+    _semantic_matrix[_semantic_next] = embedding
+    _semantic_times[_semantic_next] = time.time()
+    if len(_semantic_payloads) < SEMANTIC_CACHE_MAX_ENTRIES:
+        _semantic_payloads.append(payload)
+    else:
+        _semantic_payloads[_semantic_next] = payload
+    _semantic_next = (_semantic_next + 1) % SEMANTIC_CACHE_MAX_ENTRIES
+
+@app.on_event("startup")
+async def load_semantic_cache():
+    """
+    Загружает сохранённый семантический кэш с диска, если он есть.
+    Устаревшие записи отбрасываются, повреждённый или несовместимый файл пропускается.
+    """
+    global _semantic_next
+    try:
+        with np.load(SEMANTIC_CACHE_FILE, allow_pickle=False) as data:
+            matrix = data["embeddings"]
+            times = data["times"]
+            payloads = orjson.loads(data["payloads"].tobytes())
+        if matrix.ndim != 2 or matrix.shape[1] != EMBEDDING_DIM:
+            raise ValueError(f"неверная размерность эмбеддингов {matrix.shape}")
+        if not len(matrix) == len(times) == len(payloads):
+            raise ValueError("число эмбеддингов и записей не совпадает")
+        # Сортируем по времени, чтобы при переполнении вытеснялись самые старые записи
+        fresh = [i for i in np.argsort(times) if times[i] >= time.time() - SEMANTIC_CACHE_TTL]
+        fresh = fresh[-SEMANTIC_CACHE_MAX_ENTRIES:]
+        count = len(fresh)
+        _semantic_matrix[:count] = matrix[fresh]
+        _semantic_times[:count] = times[fresh]
+        _semantic_payloads[:] = [payloads[i] for i in fresh]
+        _semantic_next = count % SEMANTIC_CACHE_MAX_ENTRIES
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logger.warning("semantic_cache load failed: %s", e)
+
+@app.on_event("shutdown")
+async def save_semantic_cache():
+    """
+    Сохраняет семантический кэш на диск при остановке приложения.
+    Всё пишется в один файл через временный файл и os.replace, поэтому при
+    одновременной остановке нескольких воркеров файл всегда целостен
+    (остаётся кэш воркера, завершившегося последним).
+    """
+    count = len(_semantic_payloads)
+    if not count:
+        return
+    tmp_path = None
+    try:
+        os.makedirs(SEMANTIC_CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=SEMANTIC_CACHE_DIR, suffix=".tmp", delete=False) as f:
+            tmp_path = f.name
+            np.savez(
+                f,
+                embeddings=_semantic_matrix[:count],
+                times=_semantic_times[:count],
+                payloads=np.frombuffer(orjson.dumps(_semantic_payloads), dtype=np.uint8),
+            )
+        os.replace(tmp_path, SEMANTIC_CACHE_FILE)
+    except Exception as e:
+        logger.warning("semantic_cache save failed: %s", e)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Модели для этапов генерации: короткие заголовок и мета-описание быстрее и дешевле
+# на gpt-4o-mini; модель статьи (и единого запроса) можно сменить без правки кода
+TITLE_MODEL = os.getenv("TITLE_MODEL", "gpt-4o-mini")
+META_MODEL = os.getenv("META_MODEL", "gpt-4o-mini")
+POST_MODEL = os.getenv("POST_MODEL", "gpt-4o")
+
+# Статичные инструкции вынесены в системные сообщения: они побайтно совпадают между
+# вызовами, поэтому OpenAI может переиспользовать кэш префикса промпта
+SYSTEM_TITLE = (
+    "Вы — редактор блога. Придумайте привлекательный и точный заголовок для статьи "
+    "на заданную тему с учётом актуальных новостей. Ответьте только заголовком."
+)
+SYSTEM_META = (
+    "Вы — редактор блога. Напишите мета-описание для статьи. Оно должно быть полным, "
+    "информативным и содержать основные ключевые слова."
+)
+SYSTEM_POST = (
+    "Вы — автор статей для блога. Напишите подробную статью на заданную тему, "
+    "используя последние новости. Статья должна быть:\n"
+    "1. Информативной и логичной\n"
+    "2. Не менее 1500 символов\n"
+    "3. С четкой структурой с подзаголовками\n"
+    "4. С анализом текущих трендов\n"
+    "5. С примерами из актуальных новостей\n"
+    "6. Легкой для восприятия, каждый абзац — не менее 3-4 предложений"
+)
+
+# Единый промпт для генерации заголовка, мета-описания и статьи одним запросом
+SYSTEM_ALL = (
+    "Вы — автор статей для блога. По заданной теме и последним новостям подготовьте "
+    "статью и верните её в виде JSON с полями:\n"
+    "- title: привлекательный и точный заголовок статьи в одну строку, до 100 символов;\n"
+    "- meta_description: мета-описание статьи — полное, информативное, с основными "
+    "ключевыми словами, до 160 символов;\n"
+    "- post_content: подробная статья, которая должна быть:\n"
+    "1. Информативной и логичной\n"
+    "2. Не менее 1500 символов\n"
+    "3. С четкой структурой с подзаголовками\n"
+    "4. С анализом текущих трендов\n"
+    "5. С примерами из актуальных новостей\n"
+    "6. Легкой для восприятия, каждый абзац — не менее 3-4 предложений"
+)
+# Схема ответа для structured outputs; ограничения длины заданы в описаниях полей,
+# так как строгий режим не поддерживает maxLength
+POST_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "description": "Заголовок, до 100 символов"},
+        "meta_description": {"type": "string", "description": "Мета-описание, до 160 символов"},
+        "post_content": {"type": "string", "description": "Статья, не менее 1500 символов"},
+    },
+    "required": ["title", "meta_description", "post_content"],
+    "additionalProperties": False,
+}
+
+def content_request(topic: str, recent_news: str) -> Dict[str, Any]:
+    """
+    Параметры запроса к OpenAI для генерации всего поста одним вызовом.
+    """
+    return {
+        "model": POST_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_ALL},
+            {"role": "user", "content": f"Тема: '{topic}'\nНовости:\n{recent_news}"},
+        ],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "Post", "schema": POST_SCHEMA, "strict": True},
+        },
+        "max_tokens": 1800,
+        "temperature": 0.5,
+        "presence_penalty": 0.6,
+        "frequency_penalty": 0.6
+    }
+
+# Запросы по отдельным этапам (используются потоковой и пакетной генерацией)
+def title_request(topic: str, recent_news: str) -> Dict[str, Any]:
+    """
+    Параметры запроса к OpenAI для генерации заголовка.
+    """
+    return {
+        "model": TITLE_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_TITLE},
+            {"role": "user", "content": f"Тема: '{topic}'\nНовости:\n{recent_news}"},
+        ],
+        "max_tokens": 60,
+        "temperature": 0.5,
+        "stop": ["\n"]
+    }
+
+def meta_request(subject: str) -> Dict[str, Any]:
+    """
+    Параметры запроса к OpenAI для генерации мета-описания.
+    subject описывает статью, например "с заголовком: '...'".
+    """
+    return {
+        "model": META_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_META},
+            {"role": "user", "content": f"Статья {subject}"},
+        ],
+        "max_tokens": 120,
+        "temperature": 0.5,
+        "stop": ["."]
+    }
+
+def post_request(topic: str, recent_news: str) -> Dict[str, Any]:
+    """
+    Параметры запроса к OpenAI для генерации содержимого статьи.
+    """
+    return {
+        "model": POST_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_POST},
+            {"role": "user", "content": f"Тема: '{topic}'\nНовости:\n{recent_news}"},
+        ],
+        "max_tokens": 1500,
+        "temperature": 0.5,
+        "presence_penalty": 0.6,
+        "frequency_penalty": 0.6
+    }
+
+# Генерации, выполняющиеся в данный момент, по нормализованной теме:
+# одновременные одинаковые запросы ждут одну и ту же задачу
+_inflight: Dict[str, "asyncio.Task[Dict[str, str]]"] = {}
+
+async def generate_content(topic: str) -> Dict[str, str]:
     """
     Генерирует заголовок, мета-описание и статью по теме с помощью OpenAI.
-    Использует последние новости как контекст.
+    Если похожая тема уже генерировалась, возвращает результат из семантического кэша,
+    а если та же тема генерируется прямо сейчас — дожидается этой генерации.
+    """
+    embedding = await embed_topic(topic)
+    if embedding is not None:
+        cached = semantic_cache_lookup(embedding)
+        if cached is not None:
+            return cached
+
+    key = topic.strip().lower()
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_generate_content(topic, embedding))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: отключение одного клиента не должно отменять генерацию для остальных
+    return await asyncio.shield(task)
+
+async def _generate_content(topic: str, embedding: Optional[np.ndarray]) -> Dict[str, str]:
+    """
+    Генерирует пост по теме и последним новостям одним запросом к OpenAI
+    и сохраняет результат в семантический кэш.
     """
-    recent_news = get_recent_news(topic)
+    recent_news = await get_recent_news(topic)
 
     try:
-        # Генерируем заголовок
-        title_response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{
-                "role": "user",
-                "content": f"Придумайте привлекательный и точный заголовок для статьи на тему '{topic}', с учётом актуальных новостей:\n{recent_news}."
-            }],
-            max_tokens=60,
-            temperature=0.5,
-            stop=["\n"]
-        )
+        response = await _chat(**content_request(topic, recent_news))
+        choice = response.choices[0]
+        if choice.finish_reason != "stop":
+            raise ValueError(f"ответ модели не завершён ({choice.finish_reason})")
+        post = orjson.loads(choice.message.content)
+        result = {
+            "title": post["title"].strip(),
+            "meta_description": post["meta_description"].strip(),
+            "post_content": post["post_content"].strip()
+        }
+    except RateLimitError:
+        raise HTTPException(status_code=503, detail="Превышен лимит запросов к OpenAI, попробуйте позже")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка генерации текста: {str(e)}")
+
+    if embedding is not None:
+        semantic_cache_store(embedding, result)
+    return result
+
+def sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    """
+    Форматирует событие Server-Sent Events (данные сериализуются сразу в байты).
+    """
+    return b"event: %s\ndata: %s\n\n" % (event.encode(), orjson.dumps(data))
+
+async def stream_cached_content(post: Dict[str, str]) -> AsyncIterator[bytes]:
+    """
+    Отдаёт пост из кэша в том же формате событий, что и stream_content.
+    """
+    yield sse_event("title", {"title": post["title"]})
+    yield sse_event("meta_description", {"meta_description": post["meta_description"]})
+    yield sse_event("delta", {"delta": post["post_content"]})
+    yield sse_event("done", {})
+
+# Маркер конца потока в очереди read_stream
+_STREAM_END = object()
+
+async def read_stream(params: Dict[str, Any], queue: "asyncio.Queue[Any]") -> None:
+    """
+    Открывает потоковый запрос к OpenAI и сразу вычитывает его в очередь.
+    Поток читается независимо от потребителя, поэтому его слот в _openai_semaphore
+    освобождается по завершении ответа, а не когда клиент дойдёт до статьи.
+    В конце (в том числе при ошибке) в очередь кладётся _STREAM_END.
+    """
+    try:
+        stream = await _chat(**params, stream=True)
+        try:
+            async for chunk in stream:
+                queue.put_nowait(chunk)
+        finally:
+            await stream.close()
+    finally:
+        queue.put_nowait(_STREAM_END)
+
+async def stream_content(topic: str, recent_news: str, embedding: Optional[np.ndarray]) -> AsyncIterator[bytes]:
+    """
+    Генерирует пост в виде событий SSE: title, meta_description, затем фрагменты
+    статьи (delta) по мере их получения от OpenAI и завершающее done.
+    Статья запрашивается в потоковом режиме параллельно с заголовком и мета-описанием.
+    При ошибке отправляется событие error.
+    """
+    queue: "asyncio.Queue[Any]" = asyncio.Queue()
+    title_task = asyncio.create_task(_chat(**title_request(topic, recent_news)))
+    post_task = asyncio.create_task(read_stream(post_request(topic, recent_news), queue))
+    try:
+        title_response = await title_task
         title = title_response.choices[0].message.content.strip()
+        yield sse_event("title", {"title": title})
 
-        # Генерируем мета-описание
-        meta_response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{
-                "role": "user",
-                "content": f"Напишите мета-описание для статьи с заголовком: '{title}'. Оно должно быть полным, информативным и содержать основные ключевые слова."
-            }],
-            max_tokens=120,
-            temperature=0.5,
-            stop=["."]
-        )
+        meta_response = await _chat(**meta_request(f"с заголовком: '{title}'"))
         meta_description = meta_response.choices[0].message.content.strip()
+        yield sse_event("meta_description", {"meta_description": meta_description})
 
-        # Генерируем содержимое статьи
-        post_response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{
-                "role": "user",
-                "content": (
-                    f"Напишите подробную статью на тему '{topic}', используя последние новости:\n{recent_news}. "
-                    "Статья должна быть:\n"
-                    "1. Информативной и логичной\n"
-                    "2. Не менее 1500 символов\n"
-                    "3. С четкой структурой с подзаголовками\n"
-                    "4. С анализом текущих трендов\n"
-                    "5. Со вступлением, основной частью и заключением\n"
-                    "6. С примерами из актуальных новостей\n"
-                    "7. Каждый абзац — не менее 3-4 предложений\n"
-                    "8. Текст — легким для восприятия"
-                )
-            }],
-            max_tokens=1500,
-            temperature=0.5,
-            presence_penalty=0.6,
-            frequency_penalty=0.6
-        )
-        post_content = post_response.choices[0].message.content.strip()
+        parts = []
+        finish_reason = None
+        while True:
+            chunk = await queue.get()
+            if chunk is _STREAM_END:
+                break
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+            if choice.delta.content:
+                parts.append(choice.delta.content)
+                yield sse_event("delta", {"delta": choice.delta.content})
+        # Пробрасывает ошибку открытия или чтения потока
+        await post_task
+
+        # Обрезанную статью (например, finish_reason="length") в кэш не сохраняем,
+        # как и в generate_content
+        if embedding is not None and finish_reason == "stop":
+            semantic_cache_store(embedding, {
+                "title": title,
+                "meta_description": meta_description,
+                "post_content": "".join(parts).strip()
+            })
+        yield sse_event("done", {})
+    except Exception as e:
+        logger.warning("stream generation failed: %s", e)
+        yield sse_event("error", {"detail": f"Ошибка генерации текста: {str(e)}"})
+    finally:
+        # Клиент мог отключиться: отменяем незавершённые запросы
+        # (read_stream при отмене сам закрывает поток)
+        title_task.cancel()
+        post_task.cancel()
+        if post_task.done() and not post_task.cancelled():
+            post_task.exception()
+
+# Этапы генерации в пакетном режиме и поля результата, которые они заполняют
+BATCH_STAGES = {
+    "title": "title",
+    "meta": "meta_description",
+    "post": "post_content",
+}
+
+# Метка в metadata пакетных заданий, созданных этим сервисом
+BATCH_SOURCE = "generate_post_for_blog"
+# Состояния, после которых пакетное задание больше не меняется
+BATCH_TERMINAL_STATUSES = {"completed", "expired", "cancelled", "failed"}
+
+async def generate_posts_batch(topics: List[str]) -> Dict[str, Any]:
+    """
+    Создаёт задание OpenAI Batch API на генерацию постов по списку тем.
+    Возвращает идентификатор задания и номера тем, для которых не удалось получить
+    новости (для них статья пишется без новостного контекста).
+    Результаты доступны через get_batch_results.
+    В пакете этапы выполняются независимо, поэтому мета-описание строится по теме,
+    а не по сгенерированному заголовку.
+    """
+    semaphore = asyncio.Semaphore(BATCH_NEWS_CONCURRENCY)
+
+    async def news_for(topic: str) -> Optional[str]:
+        async with semaphore:
+            try:
+                return await get_recent_news(topic)
+            except HTTPException as e:
+                logger.warning("batch news failed topic=%r: %s", topic, e.detail)
+                return None
 
-        return {
-            "title": title,
-            "meta_description": meta_description,
-            "post_content": post_content
+    news = await asyncio.gather(*(news_for(topic) for topic in topics))
+
+    lines = []
+    topics_without_news = []
+    for topic_id, (topic, recent_news) in enumerate(zip(topics, news)):
+        if recent_news is None:
+            topics_without_news.append(topic_id)
+            recent_news = "Свежих новостей не найдено."
+        bodies = {
+            "title": title_request(topic, recent_news),
+            "meta": meta_request(f"на тему '{topic}'"),
+            "post": post_request(topic, recent_news),
         }
+        for stage, body in bodies.items():
+            lines.append(orjson.dumps({
+                "custom_id": f"{topic_id}:{stage}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            }))
+
+    try:
+        batch_file = await client.files.create(
+            file=("batch.jsonl", b"\n".join(lines)),
+            purpose="batch",
+        )
+        batch = await client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"source": BATCH_SOURCE, "topics": str(len(topics))},
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка генерации текста: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка создания пакетного задания: {str(e)}")
+    return {"batch_id": batch.id, "topics_without_news": topics_without_news}
+
+async def get_batch_results(batch_id: str) -> Dict[str, Any]:
+    """
+    Возвращает статус пакетного задания, а после его завершения (в том числе
+    по истечении срока или отмене) — посты для каждого номера темы в исходном списке.
+    Результаты собираются из файла ответов и файла ошибок; этапы без результата
+    возвращаются как None, а причина — в поле errors.
+    Задания, созданные не этим сервисом, считаются ненайденными;
+    строки файлов неожиданного формата пропускаются.
+    """
+    try:
+        batch = await client.batches.retrieve(batch_id)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Пакетное задание не найдено")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения пакетного задания: {str(e)}")
+
+    metadata = batch.metadata or {}
+    if metadata.get("source") != BATCH_SOURCE or not metadata.get("topics", "").isdigit():
+        raise HTTPException(status_code=404, detail="Пакетное задание не найдено")
+
+    result: Dict[str, Any] = {"batch_id": batch.id, "status": batch.status}
+    if batch.status not in BATCH_TERMINAL_STATUSES:
+        return result
+    try:
+        files = [
+            await client.files.content(file_id)
+            for file_id in (batch.output_file_id, batch.error_file_id)
+            if file_id
+        ]
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Файл результатов пакетного задания не найден")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения пакетного задания: {str(e)}")
+
+    topic_count = int(metadata["topics"])
+    posts: List[Dict[str, Any]] = [
+        {"topic_id": topic_id, **dict.fromkeys(BATCH_STAGES.values()), "errors": {}}
+        for topic_id in range(topic_count)
+    ]
+
+    for file in files:
+        for line in file.content.splitlines():
+            if not line:
+                continue
+            try:
+                item = orjson.loads(line)
+                topic_id, stage = item["custom_id"].split(":")
+                if not topic_id.isdigit():
+                    raise ValueError(f"неверный custom_id {item['custom_id']!r}")
+                post = posts[int(topic_id)]
+                field = BATCH_STAGES[stage]
+                response = item.get("response") or {}
+                if response.get("status_code") == 200:
+                    post[field] = response["body"]["choices"][0]["message"]["content"].strip()
+                else:
+                    error = item.get("error") or (response.get("body") or {}).get("error") or {}
+                    post["errors"][field] = error.get("message") or f"HTTP {response.get('status_code')}"
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                logger.warning("batch %s: skipped malformed result line: %s", batch_id, e)
+
+    # Этапы, которых нет ни в одном файле (например, не выполненные до истечения срока)
+    for post in posts:
+        for field in BATCH_STAGES.values():
+            if post[field] is None and field not in post["errors"]:
+                post["errors"][field] = "нет результата"
+
+    result["posts"] = posts
+    return result
 
 @app.post("/generate-post")
 async def generate_post_api(topic: Topic):
     """
     Эндпоинт для генерации блог-поста по теме.
     """
-    return generate_content(topic.topic)
+    return await generate_content(topic.topic)
+
+# Заголовки потокового ответа: отключают кэширование и буферизацию в прокси
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.post("/generate-post-stream")
+async def generate_post_stream_api(topic: Topic):
+    """
+    Эндпоинт для потоковой генерации блог-поста (Server-Sent Events).
+    """
+    embedding = await embed_topic(topic.topic)
+    if embedding is not None:
+        cached = semantic_cache_lookup(embedding)
+        if cached is not None:
+            return StreamingResponse(
+                stream_cached_content(cached),
+                media_type="text/event-stream",
+                headers=_SSE_HEADERS,
+            )
+
+    recent_news = await get_recent_news(topic.topic)
+    return StreamingResponse(
+        stream_content(topic.topic, recent_news, embedding),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+    )
+
+@app.post("/generate-posts-batch")
+async def generate_posts_batch_api(topics: Topics):
+    """
+    Эндпоинт для пакетной генерации постов через OpenAI Batch API.
+    Для неинтерактивных клиентов: дешевле и не расходует обычные лимиты запросов.
+    """
+    batch = await generate_posts_batch(topics.topics)
+    return {"topics": len(topics.topics), **batch}
+
+@app.get("/batch-status/{batch_id}")
+async def batch_status_api(batch_id: str):
+    """
+    Эндпоинт для проверки статуса пакетного задания и получения результатов.
+    """
+    return await get_batch_results(batch_id)
+
+# Готовность сервиса: устанавливается после прогрева соединений при старте.
+# Прогрев ограничен WARM_UP_TIMEOUT секундами, чтобы зависший внешний API
+# не держал /heartbeat в состоянии 503
+WARM_UP_TIMEOUT = float(os.getenv("WARM_UP_TIMEOUT", "10"))
+_ready = False
+_warm_up_task: Optional[asyncio.Task] = None
+
+async def warm_up() -> None:
+    """
+    Заранее устанавливает соединения с Currents API и OpenAI и прогревает кодировщик
+    tiktoken, чтобы первый запрос не платил за холодный старт.
+    Ошибки только логируются: недоступность внешних API не должна мешать запуску.
+    """
+    global _ready
+    try:
+        _ENC.encode("warm")
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                # HEAD достаточно для TLS-рукопожатия и не расходует квоту Currents API
+                _http.head(_CURRENTS_URL),
+                client.models.retrieve(POST_MODEL),
+                return_exceptions=True,
+            ),
+            timeout=WARM_UP_TIMEOUT,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("warm_up failed: %s", result)
+    except asyncio.TimeoutError:
+        logger.warning("warm_up timed out after %.1f s", WARM_UP_TIMEOUT)
+    finally:
+        _ready = True
+
+@app.on_event("startup")
+async def start_warm_up():
+    """
+    Запускает прогрев в фоне, не задерживая старт сервера.
+    """
+    global _warm_up_task
+    _warm_up_task = asyncio.create_task(warm_up())
+
+# Ответы служебных эндпоинтов сериализуются один раз при импорте
+_ROOT = ORJSONResponse({"message": "Сервис работает"})
+_OK = ORJSONResponse({"status": "OK"})
+_STARTING = ORJSONResponse({"status": "STARTING"}, status_code=503)
 
 @app.get("/")
 async def root():
     """
     Корневой эндпоинт для проверки работоспособности сервиса.
     """
-    return {"message": "Сервис работает"}
+    return _ROOT
 
 @app.get("/heartbeat")
 async def heartbeat_api():
     """
     Эндпоинт для проверки состояния сервиса.
+    Пока идёт прогрев после старта, возвращает 503, чтобы балансировщик не направлял трафик.
     """
-    return {"status": "OK"}
+    return _OK if _ready else _STARTING
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     port = int(os.getenv("PORT", 8080))
-    uvicorn.run("app:app", host="0.0.0.0", port=port)
+    # uvloop и httptools входят в uvicorn[standard]; uvloop недоступен на Windows,
+    # поэтому там остаётся стандартный цикл asyncio
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=port,
+        loop=loop,
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 2))),
+        log_level="warning",
+        access_log=False,
+    )
 
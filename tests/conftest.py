@@ -0,0 +1,22 @@
+import os
+import sys
+
+import tiktoken
+
+# app.py требует ключи API при импорте; в тестах внешние API не вызываются
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("CURRENTS_API_KEY", "test")
+
+
+class _WhitespaceEncoding:
+    """
+    Замена кодировщика tiktoken, чтобы тесты не скачивали словарь BPE.
+    """
+
+    def encode(self, text):
+        return text.split()
+
+
+tiktoken.encoding_for_model = lambda model: _WhitespaceEncoding()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
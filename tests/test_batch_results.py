@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+import app
+
+
+def make_client(monkeypatch, metadata, lines, status="completed"):
+    batch = SimpleNamespace(
+        id="batch_1",
+        status=status,
+        metadata=metadata,
+        output_file_id="output",
+        error_file_id=None,
+    )
+
+    async def retrieve(batch_id):
+        return batch
+
+    async def content(file_id):
+        return SimpleNamespace(content=b"\n".join(orjson.dumps(line) for line in lines))
+
+    monkeypatch.setattr(app, "client", SimpleNamespace(
+        batches=SimpleNamespace(retrieve=retrieve),
+        files=SimpleNamespace(content=content),
+    ))
+
+
+def ok_line(custom_id, text):
+    return {
+        "custom_id": custom_id,
+        "response": {"status_code": 200, "body": {"choices": [{"message": {"content": text}}]}},
+    }
+
+
+@pytest.mark.parametrize("metadata", [None, {}, {"topics": "1"}, {"source": "other", "topics": "1"}])
+def test_foreign_batch_is_not_found(monkeypatch, metadata):
+    make_client(monkeypatch, metadata, [])
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(app.get_batch_results("batch_1"))
+    assert error.value.status_code == 404
+
+
+def test_malformed_lines_are_skipped(monkeypatch):
+    make_client(monkeypatch, {"source": app.BATCH_SOURCE, "topics": "1"}, [
+        ok_line("0:title", "Title"),
+        ok_line("request-1", "x"),
+        ok_line("5:title", "x"),
+        ok_line("-1:title", "x"),
+        ok_line("0:unknown", "x"),
+        {"custom_id": "0:post", "response": {"status_code": 200, "body": {}}},
+    ])
+    result = asyncio.run(app.get_batch_results("batch_1"))
+    post, = result["posts"]
+    assert post["title"] == "Title"
+    assert post["meta_description"] is None and post["post_content"] is None
+    assert set(post["errors"]) == {"meta_description", "post_content"}
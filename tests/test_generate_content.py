@@ -0,0 +1,36 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import app
+
+
+@pytest.mark.parametrize("content", ['{"title": "T"}', '["T", "M", "P"]', '{"title": 1, "meta_description": "M", "post_content": "P"}'])
+def test_unexpected_structured_output_is_http_500(monkeypatch, content):
+    async def fake_news(topic):
+        return "news"
+
+    async def fake_chat(**params):
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+    async def no_embedding(topic):
+        return None
+
+    monkeypatch.setattr(app, "embed_topic", no_embedding)
+    monkeypatch.setattr(app, "get_recent_news", fake_news)
+    monkeypatch.setattr(app, "_chat", fake_chat)
+
+    async def run():
+        # Одновременные одинаковые запросы ждут одну генерацию и получают ту же HTTPException
+        return await asyncio.gather(
+            *(app.generate_content("topic") for _ in range(2)),
+            return_exceptions=True,
+        )
+
+    for error in asyncio.run(run()):
+        assert isinstance(error, HTTPException)
+        assert error.status_code == 500
+        assert error.detail.startswith("Ошибка генерации текста")
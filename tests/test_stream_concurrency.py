@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app
+
+
+class FakeStream:
+    """
+    Потоковый ответ OpenAI из нескольких фрагментов.
+    """
+
+    def __init__(self, parts):
+        self._parts = parts
+        self.closed = False
+
+    async def _chunks(self):
+        for part in self._parts:
+            await asyncio.sleep(0.01)
+            yield SimpleNamespace(choices=[SimpleNamespace(
+                delta=SimpleNamespace(content=part), finish_reason=None)])
+        yield SimpleNamespace(choices=[SimpleNamespace(
+            delta=SimpleNamespace(content=None), finish_reason="stop")])
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def close(self):
+        self.closed = True
+
+
+async def fake_create(**params):
+    await asyncio.sleep(0.01)
+    if params.get("stream"):
+        return FakeStream(["Hel", "lo"])
+    message = SimpleNamespace(content="Text")
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """
+    Подменяет клиента OpenAI и позволяет задать OPENAI_MAX_CONCURRENCY для теста.
+    """
+    monkeypatch.setattr(app, "client", SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create))))
+    monkeypatch.setattr(app, "_openai_bucket", app.TokenBucket(rpm=10**6, tpm=10**9))
+
+    def set_concurrency(value):
+        monkeypatch.setattr(app, "_openai_semaphore", asyncio.Semaphore(value))
+
+    return set_concurrency
+
+
+async def collect(topic):
+    return [event async for event in app.stream_content(topic, "news", None)]
+
+
+@pytest.mark.parametrize("concurrency, requests", [(1, 1), (1, 3), (20, 19), (20, 40)])
+def test_stream_content_does_not_deadlock(limits, concurrency, requests):
+    async def run():
+        limits(concurrency)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(collect(f"topic {i}") for i in range(requests))),
+            timeout=5,
+        )
+        # Все слоты освобождены после завершения потоков
+        assert app._openai_semaphore._value == concurrency
+        return results
+
+    for events in asyncio.run(run()):
+        assert events[0].startswith(b"event: title")
+        assert events[1].startswith(b"event: meta_description")
+        assert b"".join(events[2:-1]).count(b"event: delta") == 2
+        assert events[-1].startswith(b"event: done")
+
+
+def test_stream_content_releases_slot_on_disconnect(limits):
+    async def run():
+        limits(1)
+        events = app.stream_content("topic", "news", None)
+        assert (await events.__anext__()).startswith(b"event: title")
+        # Клиент отключился до статьи: фоновый поток отменяется, слот освобождается
+        await events.aclose()
+        await asyncio.sleep(0.05)
+        assert app._openai_semaphore._value == 1
+        events = await asyncio.wait_for(collect("next"), timeout=5)
+        assert events[-1].startswith(b"event: done")
+
+    asyncio.run(run())